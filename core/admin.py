@@ -11,12 +11,61 @@ from .models import (
     Payment,
 )
 
-admin.site.register(CustomerProfile)
-admin.site.register(Address)
+# raw_id_fields: evita <select> com todas as linhas da tabela relacionada
+# list_select_related: evita N+1 ao exibir __str__ de FKs na listagem
+
 admin.site.register(Category)
-admin.site.register(Product)
-admin.site.register(Cart)
-admin.site.register(CartItem)
-admin.site.register(Order)
-admin.site.register(OrderItem)
-admin.site.register(Payment)
+
+
+@admin.register(CustomerProfile)
+class CustomerProfileAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "cpf", "phone")
+    list_select_related = ("user",)
+    raw_id_fields = ("user",)
+
+
+@admin.register(Address)
+class AddressAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "street", "number", "city", "state", "is_default")
+    list_select_related = ("user",)
+    raw_id_fields = ("user",)
+
+
+@admin.register(Product)
+class ProductAdmin(admin.ModelAdmin):
+    list_display = ("id", "name", "category", "price", "stock", "is_active")
+    list_select_related = ("category",)
+
+
+@admin.register(Cart)
+class CartAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "status", "updated_at")
+    list_select_related = ("user",)
+    raw_id_fields = ("user",)
+
+
+@admin.register(CartItem)
+class CartItemAdmin(admin.ModelAdmin):
+    list_display = ("id", "cart_id", "product_id", "quantity")
+    list_select_related = ("cart", "product", "product__category")
+    raw_id_fields = ("cart", "product")
+
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "status", "total", "created_at")
+    list_select_related = ("user", "cart", "payment")
+    raw_id_fields = ("user", "cart")
+
+
+@admin.register(OrderItem)
+class OrderItemAdmin(admin.ModelAdmin):
+    list_display = ("id", "order_id", "product", "quantity", "unit_price", "subtotal")
+    list_select_related = ("product",)
+    raw_id_fields = ("order", "product")
+
+
+@admin.register(Payment)
+class PaymentAdmin(admin.ModelAdmin):
+    list_display = ("id", "order_id", "method", "status", "paid_at")
+    raw_id_fields = ("order",)
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from core.models import Order
+
+
+class Command(BaseCommand):
+    help = "Recalcula Order.total a partir dos itens e corrige pedidos divergentes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Apenas lista os pedidos divergentes, sem gravar.",
+        )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        # uma única query agregada (GROUP BY) em vez de um loop por pedido
+        drifted = list(
+            Order.objects
+            .annotate_totals()
+            .exclude(total=F("computed_total"))
+            .only("id", "total")
+        )
+
+        for order in drifted:
+            self.stdout.write(f"Pedido #{order.id}: {order.total} -> {order.computed_total}")
+            order.total = order.computed_total
+
+        if not options["dry_run"]:
+            Order.objects.bulk_update(drifted, ["total"], batch_size=500)
+
+        self.stdout.write(self.style.SUCCESS(f"{len(drifted)} pedido(s) divergente(s)."))
@@ -0,0 +1,17 @@
+from django.utils.functional import SimpleLazyObject
+
+from .services.cart import get_or_create_active_cart
+
+
+class CartMiddleware:
+    """
+    Expõe `request.cart`: o carrinho ativo do usuário, buscado no máximo uma
+    vez por requisição e só se alguma view (ou decorator) acessar.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.cart = SimpleLazyObject(lambda: get_or_create_active_cart(user=request.user))
+        return self.get_response(request)
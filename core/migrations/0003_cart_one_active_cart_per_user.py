@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-15 11:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def abandon_duplicate_active_carts(apps, schema_editor):
+    """
+    Mantém só o carrinho ativo mais recente de cada usuário; os demais
+    viram "abandoned" para a constraint poder ser criada.
+    """
+    Cart = apps.get_model("core", "Cart")
+    seen_users = set()
+    duplicate_ids = []
+
+    active_carts = (
+        Cart.objects
+        .filter(status="active", user__isnull=False)
+        .order_by("user_id", "-updated_at", "-id")
+        .values_list("id", "user_id")
+    )
+    for cart_id, user_id in active_carts:
+        if user_id in seen_users:
+            duplicate_ids.append(cart_id)
+        else:
+            seen_users.add(user_id)
+
+    Cart.objects.filter(id__in=duplicate_ids).update(status="abandoned")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_cart_core_cart_user_id_118f05_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(abandon_duplicate_active_carts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'active')), fields=('user',), name='one_active_cart_per_user'),
+        ),
+    ]
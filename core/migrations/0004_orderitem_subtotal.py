@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-15 11:02
+
+import django.db.models.expressions
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_cart_one_active_cart_per_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='subtotal',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(models.F('unit_price'), '*', models.F('quantity')), output_field=models.DecimalField(decimal_places=2, max_digits=12)),
+        ),
+    ]
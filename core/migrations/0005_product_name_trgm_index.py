@@ -0,0 +1,33 @@
+from django.db import migrations
+
+
+# Índice trigram para a busca da home (name__icontains).
+# No PostgreSQL o icontains vira UPPER("name"::text) LIKE UPPER('%q%'); um índice
+# GIN com gin_trgm_ops sobre a mesma expressão evita o seq scan. Em outros bancos
+# (SQLite no desenvolvimento) a migração não faz nada.
+
+def create_trgm_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS core_product_name_trgm_idx "
+        "ON core_product USING gin (UPPER(name::text) gin_trgm_ops)"
+    )
+
+
+def drop_trgm_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS core_product_name_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_orderitem_subtotal'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trgm_index, drop_trgm_index),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-15 11:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_product_name_trgm_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(fields=['user', '-is_default', '-id'], name='core_addres_user_id_d623e0_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-15 11:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_address_user_default_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'name', 'id'], name='core_produc_is_acti_8d3316_idx'),
+        ),
+    ]
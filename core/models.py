@@ -2,6 +2,8 @@ from decimal import Decimal
 from django.conf import settings
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import F, Prefetch, Sum, Value
+from django.db.models.functions import Coalesce
 from django.utils.text import slugify
 from django.utils import timezone
 
@@ -47,6 +49,9 @@ class Address(models.Model):
 
     class Meta:
         ordering = ["-is_default", "-created_at"]
+        indexes = [
+            models.Index(fields=["user", "-is_default", "-id"]),
+        ]
 
     def __str__(self) -> str:
         return f"{self.street}, {self.number} - {self.city}/{self.state}"
@@ -57,6 +62,7 @@ class Category(models.Model):
     slug = models.SlugField(max_length=140, unique=True, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = "Categories"
@@ -71,6 +77,22 @@ class Category(models.Model):
         return self.name
 
 
+class ProductQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(is_active=True)
+
+    def for_card(self):
+        """
+        Produtos ativos só com as colunas de um card de listagem
+        (sem description e demais campos pesados).
+        """
+        return (
+            self.active()
+            .select_related("category")
+            .only("id", "slug", "name", "price", "image", "category__name")
+        )
+
+
 class Product(models.Model):
     category = models.ForeignKey(
         Category,
@@ -97,12 +119,18 @@ class Product(models.Model):
     image = models.ImageField(upload_to="products/", blank=True, null=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
+    # entra na chave de cache do resumo do carrinho (preço, nome, is_active);
+    # queryset.update() não atualiza auto_now: passe updated_at=timezone.now()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ProductQuerySet.as_manager()
 
     class Meta:
         ordering = ["name"]
         indexes = [
             models.Index(fields=["slug"]),
             models.Index(fields=["is_active"]),
+            models.Index(fields=["is_active", "name", "id"]),
         ]
 
     def save(self, *args, **kwargs):
@@ -142,6 +170,14 @@ class Cart(models.Model):
         ordering = ["-updated_at"]
         indexes = [
             models.Index(fields=["status", "updated_at"]),
+            models.Index(fields=["user", "status", "-updated_at"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user"],
+                condition=models.Q(status="active"),
+                name="one_active_cart_per_user",
+            )
         ]
 
     def __str__(self) -> str:
@@ -179,6 +215,44 @@ class CartItem(models.Model):
         return f"{self.product} x{self.quantity} (Carrinho #{self.cart_id})"
 
 
+class OrderQuerySet(models.QuerySet):
+    def with_items(self):
+        """
+        Pré-carrega os itens (com produto e categoria) numa única query extra,
+        evitando N+1 ao renderizar listas/detalhes de pedidos.
+        """
+        items = (
+            OrderItem.objects
+            .select_related("product", "product__category")
+            .only(
+                "id",
+                "order",
+                "product",
+                "quantity",
+                "unit_price",
+                "subtotal",
+                "product__name",
+                "product__slug",
+                "product__image",
+                "product__category__name",
+            )
+        )
+        return self.prefetch_related(Prefetch("items", queryset=items))
+
+    def annotate_totals(self):
+        """
+        Adiciona `computed_total` (soma dos itens) calculado pelo banco num
+        único GROUP BY — útil para conciliar com o `total` persistido.
+        """
+        return self.annotate(
+            computed_total=Coalesce(
+                Sum("items__subtotal"),
+                Value(Decimal("0.00")),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            )
+        )
+
+
 #Pedido
 class Order(models.Model):
     class Status(models.TextChoices):
@@ -228,10 +302,13 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = OrderQuerySet.as_manager()
+
     class Meta:
         ordering = ["-created_at"]
         indexes = [
             models.Index(fields=["status", "created_at"]),
+            models.Index(fields=["user", "status", "-created_at"]),
         ]
 
     def __str__(self) -> str:
@@ -255,9 +332,13 @@ class Order(models.Model):
         )
 
     def recalc_total(self, save: bool = True) -> Decimal:
-        total = Decimal("0.00")
-        for item in self.items.all():
-            total += item.subtotal
+        """
+        Recalcula o total a partir dos itens já gravados no banco.
+        Uso fora do fluxo normal (admin / conciliação): o checkout já grava
+        o total calculado no INSERT do pedido, não chame isto no caminho feliz.
+        """
+        # soma calculada no banco (evita carregar cada OrderItem em Python)
+        total = self.items.aggregate(t=Sum("subtotal"))["t"] or Decimal("0.00")
         self.total = total
         if save:
             self.save(update_fields=["total", "updated_at"])
@@ -284,6 +365,12 @@ class OrderItem(models.Model):
         decimal_places=2,
         validators=[MinValueValidator(Decimal("0.01"))],
     )
+    # calculado pelo banco (unit_price * quantity) e persistido na linha
+    subtotal = models.GeneratedField(
+        expression=F("unit_price") * F("quantity"),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        db_persist=True,
+    )
 
     class Meta:
         constraints = [
@@ -296,10 +383,6 @@ class OrderItem(models.Model):
     def __str__(self) -> str:
         return f"{self.product} x{self.quantity} (Pedido #{self.order_id})"
 
-    @property
-    def subtotal(self) -> Decimal:
-        return (self.unit_price or Decimal("0.00")) * self.quantity
-
 
 class Payment(models.Model):
     class Status(models.TextChoices):
@@ -1,8 +1,11 @@
 from dataclasses import dataclass
+from decimal import Decimal
 from typing import Optional
 
-from django.db import transaction
-from django.db.models import F
+from django.db import IntegrityError, transaction
+from django.core.cache import cache
+from django.db.models import DecimalField, ExpressionWrapper, F, Max, Sum, Window
+from django.utils import timezone
 
 from ..models import Cart, CartItem, Product
 from django.shortcuts import get_object_or_404
@@ -23,22 +26,35 @@ class InvalidQuantityError(CartError):
     pass
 
 
-@transaction.atomic
+CART_SUMMARY_CACHE_TIMEOUT = 600  # segundos
+
+
+def touch_cart(cart_id: int) -> None:
+    """
+    Atualiza o updated_at do carrinho (update() não dispara o auto_now).
+    Toda alteração de itens deve chamar isto: o cache do resumo é
+    versionado por esse timestamp.
+    """
+    Cart.objects.filter(id=cart_id).update(updated_at=timezone.now())
+
+
 def get_or_create_active_cart(*, user) -> Cart:
     """
     Retorna o carrinho ativo do usuário (ou cria um novo).
-    Regra: usuário deve ter no máximo 1 carrinho ativo.
-    """
-    cart = (
-        Cart.objects
-        .select_for_update()
-        .filter(user=user, status=Cart.Status.ACTIVE)
-        .order_by("-updated_at")
-        .first()
-    )
-    if cart:
-        return cart
-    return Cart.objects.create(user=user, status=Cart.Status.ACTIVE)
+    Regra: usuário deve ter no máximo 1 carrinho ativo (garantida pela
+    constraint "one_active_cart_per_user", sem precisar travar linhas).
+    """
+    try:
+        return Cart.objects.get(user=user, status=Cart.Status.ACTIVE)
+    except Cart.DoesNotExist:
+        pass
+
+    try:
+        # savepoint: se outra requisição criou o carrinho antes, só este trecho é desfeito
+        with transaction.atomic():
+            return Cart.objects.create(user=user, status=Cart.Status.ACTIVE)
+    except IntegrityError:
+        return Cart.objects.get(user=user, status=Cart.Status.ACTIVE)
 
 
 @transaction.atomic
@@ -50,8 +66,18 @@ def add_to_cart(*, user, product_id: int, quantity: int = 1) -> Cart:
     if quantity <= 0:
         raise InvalidQuantityError("Quantidade deve ser maior que zero.")
 
-    product = Product.objects.filter(id=product_id, is_active=True).first()
-    if not product:
+    try:
+        # trava o produto: adições concorrentes do mesmo item ficam serializadas
+        product = (
+            Product.objects
+            .select_for_update(of=("self",))
+            .only("id", "stock", "is_active")
+            .get(pk=product_id)
+        )
+    except Product.DoesNotExist:
+        raise ProductUnavailableError("Produto não encontrado ou inativo.")
+
+    if not product.is_active:
         raise ProductUnavailableError("Produto não encontrado ou inativo.")
 
     # validação leve (não é a validação final)
@@ -60,23 +86,20 @@ def add_to_cart(*, user, product_id: int, quantity: int = 1) -> Cart:
 
     cart = get_or_create_active_cart(user=user)
 
-    item, created = CartItem.objects.get_or_create(
-        cart=cart,
-        product=product,
-        defaults={"quantity": quantity},
+    # incrementa quantidade sem condição de corrida (só se couber no estoque)
+    updated = (
+        CartItem.objects
+        .filter(cart=cart, product_id=product_id, quantity__lte=product.stock - quantity)
+        .update(quantity=F("quantity") + quantity)
     )
 
-    if not created:
-        # incrementa quantidade sem condição de corrida
-        new_qty = item.quantity + quantity
-        if product.stock < new_qty:
+    if not updated:
+        if CartItem.objects.filter(cart=cart, product_id=product_id).exists():
             raise ProductUnavailableError(f"Estoque insuficiente. Disponível: {product.stock}")
 
-        CartItem.objects.filter(id=item.id).update(quantity=F("quantity") + quantity)
+        CartItem.objects.create(cart=cart, product_id=product_id, quantity=quantity)
 
-    # atualiza timestamp do carrinho
-    Cart.objects.filter(id=cart.id).update()
-    cart.refresh_from_db()
+    touch_cart(cart.id)
     return cart
 
 
@@ -89,8 +112,12 @@ def set_item_quantity(*, user, product_id: int, quantity: int) -> Cart:
     if quantity < 0:
         raise InvalidQuantityError("Quantidade não pode ser negativa.")
 
-    product = Product.objects.filter(id=product_id, is_active=True).first()
-    if not product:
+    try:
+        product = Product.objects.only("id", "stock", "is_active").get(pk=product_id)
+    except Product.DoesNotExist:
+        raise ProductUnavailableError("Produto não encontrado ou inativo.")
+
+    if not product.is_active:
         raise ProductUnavailableError("Produto não encontrado ou inativo.")
 
     cart = get_or_create_active_cart(user=user)
@@ -103,16 +130,19 @@ def set_item_quantity(*, user, product_id: int, quantity: int) -> Cart:
         if product.stock < quantity:
             raise ProductUnavailableError(f"Estoque insuficiente. Disponível: {product.stock}")
         CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+        touch_cart(cart.id)
         return cart
 
     if quantity == 0:
         item.delete()
+        touch_cart(cart.id)
         return cart
 
     if product.stock < quantity:
         raise ProductUnavailableError(f"Estoque insuficiente. Disponível: {product.stock}")
 
     CartItem.objects.filter(id=item.id).update(quantity=quantity)
+    touch_cart(cart.id)
     return cart
 
 
@@ -120,47 +150,98 @@ def set_item_quantity(*, user, product_id: int, quantity: int) -> Cart:
 def remove_from_cart(*, user, product_id: int) -> Cart:
     cart = get_or_create_active_cart(user=user)
     CartItem.objects.filter(cart=cart, product_id=product_id).delete()
+    touch_cart(cart.id)
     return cart
 
 
+def cart_summary_cache_key(*, cart: Cart) -> str:
+    """
+    Chave montada só com estado do banco (vale para todos os processos):
+    muda quando os itens mudam (touch_cart) e quando algum produto ou
+    categoria do carrinho é salvo (updated_at).
+    """
+    stamps = cart.items.aggregate(
+        product_ts=Max("product__updated_at"),
+        category_ts=Max("product__category__updated_at"),
+    )
+    product_ts = stamps["product_ts"].timestamp() if stamps["product_ts"] else 0
+    category_ts = stamps["category_ts"].timestamp() if stamps["category_ts"] else 0
+    return f"cart_summary:{cart.id}:{cart.updated_at.timestamp()}:{product_ts}:{category_ts}"
+
+
 def cart_summary(*, cart: Cart) -> dict:
     """
-    Retorna um resumo calculado do carrinho (não persiste total).
+    Retorna um resumo calculado do carrinho (não persiste total), para exibição.
+    Fica em cache por cart_summary_cache_key(); telas que confirmam valor
+    (checkout) devem usar compute_cart_summary().
     """
+    cache_key = cart_summary_cache_key(cart=cart)
+    summary = cache.get(cache_key)
+    if summary is None:
+        summary = compute_cart_summary(cart=cart)
+        cache.set(cache_key, summary, CART_SUMMARY_CACHE_TIMEOUT)
+    return summary
+
+
+def compute_cart_summary(*, cart: Cart) -> dict:
+    """
+    Resumo do carrinho sempre lido do banco (sem cache).
+    Subtotais e total saem da mesma query (o total é um SUM() OVER ()),
+    sem multiplicar Decimals em Python.
+    """
+    line_subtotal = ExpressionWrapper(
+        F("quantity") * F("product__price"),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
     items = (
         cart.items
         .select_related("product", "product__category")
-        .all()
+        .annotate(
+            line_subtotal=line_subtotal,
+            cart_total=Window(
+                Sum(line_subtotal),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
+        .only(
+            "id",
+            "cart",
+            "quantity",
+            "product__id",
+            "product__slug",
+            "product__name",
+            "product__price",
+            "product__image",
+            "product__category__name",
+        )
     )
 
-    total = 0
+    total = Decimal("0.00")
     lines = []
 
     for it in items:
         product = it.product
-
-        subtotal = product.price * it.quantity
-        total += subtotal
+        # no SQLite expressões decimais voltam como float; arredonda para centavos
+        total = it.cart_total.quantize(Decimal("0.01"))
 
         # imagem (se existir)
         image_url = ""
-        if getattr(product, "image", None):
+        if product.image:
             try:
-                if product.image:
-                    image_url = product.image.url
+                image_url = product.image.url
             except Exception:
                 image_url = ""
 
         lines.append({
             "cart_item_id": it.id,
             "product_id": product.id,
-            "slug": getattr(product, "slug", ""),
+            "slug": product.slug,
             "name": product.name,
-            "category": product.category.name if getattr(product, "category", None) else "",
+            "category": product.category.name,
             "image_url": image_url,
             "unit_price": product.price,
             "quantity": it.quantity,
-            "subtotal": subtotal,
+            "subtotal": it.line_subtotal.quantize(Decimal("0.01")),
         })
 
     return {"cart_id": cart.id, "items": lines, "total": total}
@@ -180,12 +261,16 @@ def remove_cart_item(user, item_id: int):
     )
 
     item.delete()
+    touch_cart(cart.id)
 
 
 @transaction.atomic
 def update_cart_item_quantity(user, item_id: int, quantity: int):
     item = get_object_or_404(
-        CartItem.objects.select_related("cart", "product").select_for_update(),
+        CartItem.objects
+        .select_related("cart", "product")
+        .select_for_update(of=("self",))
+        .only("id", "quantity", "cart__id", "product__id", "product__is_active", "product__stock"),
         id=item_id,
         cart__user=user,
         cart__status=Cart.Status.ACTIVE,
@@ -193,14 +278,16 @@ def update_cart_item_quantity(user, item_id: int, quantity: int):
 
     if quantity <= 0:
         item.delete()
+        touch_cart(item.cart_id)
         return None
 
     if not item.product.is_active:
-        raise ValueError("Produto indisponível.")
+        raise ProductUnavailableError("Produto indisponível.")
 
     if quantity > item.product.stock:
-        raise ValueError(f"Estoque insuficiente. Disponível: {item.product.stock}")
+        raise ProductUnavailableError(f"Estoque insuficiente. Disponível: {item.product.stock}")
 
     item.quantity = quantity
-    item.save()  # <-- salva SEM update_fields (mais difícil dar “falso positivo”)
+    item.save(update_fields=["quantity"])
+    touch_cart(item.cart_id)
     return item
\ No newline at end of file
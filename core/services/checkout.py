@@ -1,6 +1,7 @@
 from decimal import Decimal
 from django.db import transaction
-from ..models import Address, Cart, Order, OrderItem, Product
+from django.utils import timezone
+from ..models import Address, Cart, CartItem, Order, OrderItem, Product
 
 
 class CheckoutError(Exception):
@@ -21,16 +22,19 @@ def checkout_cart(*, user, cart_id: int, address_id: int) -> Order:
     Converte um carrinho ativo em pedido:
     - valida endereço pertence ao usuário
     - trava produtos (select_for_update)
-    - valida estoque definitivo
-    - cria Order com snapshot do endereço
+    - valida estoque definitivo e calcula total
+    - cria Order com snapshot do endereço (já com o total)
     - cria OrderItems com unit_price
     - baixa estoque
-    - calcula total
     - marca carrinho como CONVERTED
     """
     # 1) valida endereço
     try:
-        address = Address.objects.get(id=address_id, user=user)
+        address = (
+            Address.objects
+            .only("cep", "street", "number", "complement", "district", "city", "state")
+            .get(id=address_id, user=user)
+        )
     except Address.DoesNotExist:
         raise InvalidCartError("Endereço inválido ou não pertence ao usuário.")
 
@@ -40,36 +44,51 @@ def checkout_cart(*, user, cart_id: int, address_id: int) -> Order:
     except Cart.DoesNotExist:
         raise InvalidCartError("Carrinho inválido ou não está ativo.")
 
-    cart_items = list(cart.items.select_related("product").all())
+    # os produtos são lidos (e travados) abaixo; aqui bastam ids e quantidades
+    cart_items = list(cart.items.only("id", "cart", "product", "quantity"))
     if not cart_items:
         raise InvalidCartError("Carrinho vazio.")
 
+    # unique_product_per_cart garante ids distintos
     product_ids = [it.product_id for it in cart_items]
 
     # 3) trava os produtos (evita duas compras ao mesmo tempo estourarem estoque)
-    products = Product.objects.select_for_update().filter(id__in=product_ids, is_active=True)
-    products_by_id = {p.id: p for p in products}
+    # ordem fixa por id: checkouts concorrentes travam na mesma ordem (sem deadlock)
+    products_by_id = (
+        Product.objects
+        .select_for_update()
+        .only("id", "stock", "price", "is_active", "name")
+        .order_by("id")
+        .in_bulk(sorted(product_ids))
+    )
+
+    if len(products_by_id) != len(product_ids):
+        raise InvalidCartError("Existe produto inexistente ou inativo no carrinho.")
 
-    if len(products_by_id) != len(set(product_ids)):
+    if any(not p.is_active for p in products_by_id.values()):
         raise InvalidCartError("Existe produto inexistente ou inativo no carrinho.")
 
-    # 4) valida estoque definitivo
+    # 4) valida estoque definitivo e calcula o total (preços já travados)
+    total = Decimal("0.00")
     for it in cart_items:
         p = products_by_id[it.product_id]
         if p.stock < it.quantity:
             raise OutOfStockError(f"Sem estoque para '{p.name}'. Disponível: {p.stock}")
-
-    # 5) cria pedido com snapshot do endereço
-    order = Order.from_address(user=user, address=address)
-    order.status = Order.Status.PENDING
-    # opcional (se você adicionou o campo cart no Order)
-    if hasattr(order, "cart_id"):
-        order.cart = cart
+        total += p.price * it.quantity
+
+    # 5) cria pedido com snapshot do endereço (um único INSERT, já com total)
+    order = Order.from_address(
+        user=user,
+        address=address,
+        status=Order.Status.PENDING,
+        cart=cart,
+        total=total,
+    )
     order.save()
 
     # 6) cria itens do pedido e baixa estoque
-    total = Decimal("0.00")
     order_items_to_create = []
+    updated_products = []
 
     for it in cart_items:
         p = products_by_id[it.product_id]
@@ -82,20 +101,17 @@ def checkout_cart(*, user, cart_id: int, address_id: int) -> Order:
             unit_price=unit_price,
         ))
 
-        total += unit_price * it.quantity
-
         p.stock -= it.quantity
-        p.save(update_fields=["stock"])
+        updated_products.append(p)
 
     OrderItem.objects.bulk_create(order_items_to_create)
+    # baixa de estoque em um único UPDATE (linhas já travadas acima)
+    Product.objects.bulk_update(updated_products, ["stock"], batch_size=500)
 
-    # 7) finaliza total do pedido
-    order.total = total
-    order.save(update_fields=["total"])
-
-    # 8) marca carrinho como convertido e limpa itens (opcional)
+    # 7) marca carrinho como convertido e limpa itens (opcional)
     cart.status = Cart.Status.CONVERTED
-    cart.save(update_fields=["status"])
-    cart.items.all().delete()
+    Cart.objects.filter(id=cart.id).update(status=cart.status, updated_at=timezone.now())
+    # CartItem não tem dependentes nem signals: o Django faz um DELETE direto, sem SELECT
+    CartItem.objects.filter(cart_id=cart.id).delete()
 
     return order
@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import transaction
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
@@ -5,6 +7,10 @@ from django.utils import timezone
 from core.models import Order, Payment
 
 
+class PaymentError(Exception):
+    pass
+
+
 @transaction.atomic
 def simulate_payment(user, order_id: int, method: str):
     """
@@ -16,37 +22,43 @@ def simulate_payment(user, order_id: int, method: str):
     """
 
     # 1. Busca o pedido do usuário e trava a linha
+    # (o pagamento vem no mesmo SELECT; "of" evita travar o lado nulo do LEFT JOIN)
     order = get_object_or_404(
-        Order.objects.select_for_update(),
+        Order.objects.select_for_update(of=("self",)).select_related("payment"),
         id=order_id,
         user=user,
     )
 
     # 2. Se o pedido já tem pagamento
-    if hasattr(order, "payment"):
+    try:
         payment = order.payment
+    except Payment.DoesNotExist:
+        payment = None
 
+    if payment is not None:
         if payment.status == Payment.Status.PAID:
             return payment
 
         if payment.status != Payment.Status.PENDING:
-            raise ValueError("Este pedido não pode ser pago no momento.")
+            raise PaymentError("Este pedido não pode ser pago no momento.")
 
     # 3. Pedido precisa estar pendente
     if order.status != Order.Status.PENDING:
-        raise ValueError("Este pedido não está pendente para pagamento.")
+        raise PaymentError("Este pedido não está pendente para pagamento.")
 
     # 4. Cria o pagamento (mock)
+    now = timezone.now()
     payment = Payment.objects.create(
         order=order,
         method=method,
         status=Payment.Status.PAID,
-        paid_at=timezone.now(),
-        transaction_id="MOCK-" + timezone.now().strftime("%Y%m%d%H%M%S"),
+        paid_at=now,
+        # sufixo aleatório: dois pagamentos no mesmo segundo não colidem
+        transaction_id=f"MOCK-{now:%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}",
     )
 
     # 5. Atualiza status do pedido
     order.status = Order.Status.PAID
-    order.save(update_fields=["status"])
+    Order.objects.filter(id=order.id).update(status=order.status, updated_at=now)
 
     return payment
@@ -1,3 +1,128 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+
+from .models import Cart, Category, Product
+from .services.cart import (
+    add_to_cart,
+    cart_summary,
+    cart_summary_cache_key,
+    get_or_create_active_cart,
+    touch_cart,
+)
+
+
+class CartSummaryCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("cliente", password="senha-123")
+        category = Category.objects.create(name="Camisetas")
+        self.product = Product.objects.create(
+            category=category, name="Camiseta", price=Decimal("3.50"), stock=10
+        )
+        self.cart = add_to_cart(user=self.user, product_id=self.product.id, quantity=2)
+        self.cart.refresh_from_db()
+
+    def test_key_changes_after_touch_cart(self):
+        key = cart_summary_cache_key(cart=self.cart)
+
+        touch_cart(self.cart.id)
+        self.cart.refresh_from_db()
+
+        self.assertNotEqual(cart_summary_cache_key(cart=self.cart), key)
+
+    def test_key_changes_after_product_save(self):
+        key = cart_summary_cache_key(cart=self.cart)
+
+        self.product.price = Decimal("99.00")
+        self.product.save()
+
+        self.assertNotEqual(cart_summary_cache_key(cart=self.cart), key)
+
+    def test_summary_reflects_new_price(self):
+        self.assertEqual(cart_summary(cart=self.cart)["total"], Decimal("7.00"))
+
+        self.product.price = Decimal("99.00")
+        self.product.save()
+
+        summary = cart_summary(cart=self.cart)
+        self.assertEqual(summary["items"][0]["unit_price"], Decimal("99.00"))
+        self.assertEqual(summary["total"], Decimal("198.00"))
+
+
+class ActiveCartTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("cliente", password="senha-123")
+
+    def test_middleware_only_loads_cart_when_accessed(self):
+        self.client.force_login(self.user)
+
+        self.client.get(reverse("home"))
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+
+        self.client.get(reverse("cart_detail"))
+        self.assertEqual(Cart.objects.filter(user=self.user).count(), 1)
+
+    def test_concurrent_creation_falls_back_to_existing_cart(self):
+        existing = Cart.objects.create(user=self.user, status=Cart.Status.ACTIVE)
+        real_get = Cart.objects.get
+        calls = []
+
+        # simula a corrida: a primeira leitura não vê o carrinho criado por outra requisição
+        def racy_get(*args, **kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                raise Cart.DoesNotExist
+            return real_get(*args, **kwargs)
+
+        with mock.patch.object(Cart.objects, "get", side_effect=racy_get):
+            cart = get_or_create_active_cart(user=self.user)
+
+        self.assertEqual(cart, existing)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(Cart.objects.filter(user=self.user, status=Cart.Status.ACTIVE).count(), 1)
+
+
+class CartDetailETagTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("cliente", password="senha-123")
+        category = Category.objects.create(name="Camisetas")
+        self.product = Product.objects.create(
+            category=category, name="Camiseta", price=Decimal("3.50"), stock=10
+        )
+        add_to_cart(user=self.user, product_id=self.product.id, quantity=1)
+        self.client.force_login(self.user)
+        self.url = reverse("cart_detail")
+        # a primeira visita define o cookie CSRF, que faz parte do ETag
+        self.client.get(self.url)
+
+    def test_unchanged_cart_returns_304(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_product_change_invalidates_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        self.product.price = Decimal("99.00")
+        self.product.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertContains(response, "99.00")
+
+    def test_item_change_invalidates_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        add_to_cart(user=self.user, product_id=self.product.id, quantity=1)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
 
-# Create your tests here.
+        self.assertEqual(response.status_code, 200)
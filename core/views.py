@@ -1,18 +1,67 @@
+import hashlib
+from functools import lru_cache
+
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse, HttpResponseRedirect
 from django.contrib.auth import authenticate, login
 from django.contrib import messages 
 from django.views.generic import ListView, DetailView
 from .forms import SignUpForm, AddressForm
-from .models import Product, Address, Order, Payment
-from django.views.decorators.http import require_POST 
-from .services.cart import add_to_cart, get_or_create_active_cart, cart_summary, remove_cart_item, update_cart_item_quantity
-from .services.checkout import checkout_cart
-from .services.payment import simulate_payment
+from .models import Product, Address, Cart, Order, Payment
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
+from .services.cart import CartError, add_to_cart, cart_summary, cart_summary_cache_key, compute_cart_summary, remove_cart_item, update_cart_item_quantity
+from .services.checkout import CheckoutError, checkout_cart
+from .services.payment import PaymentError, simulate_payment
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db import transaction
+from django.db.models import Case, Count, Value, When
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+
+
+ALLOWED_PAYMENT_METHODS = frozenset(Payment.Method.values)
+
+MAX_CART_QUANTITY = 999
+
+CHECKOUT_ADDRESS_LIMIT = 10
+
+
+def _parse_quantity(raw: str) -> int:
+    """
+    Quantidade do form: inválida -> 1; acima do limite -> MAX_CART_QUANTITY.
+    O tamanho é checado antes do int(), que recusa strings com milhares de dígitos.
+    """
+    qty_str = raw.strip()
+    if not qty_str.isdecimal():
+        return 1
+    if len(qty_str.lstrip("0")) > len(str(MAX_CART_QUANTITY)):
+        return MAX_CART_QUANTITY
+    return min(int(qty_str), MAX_CART_QUANTITY)
+
+
+class HttpResponseSeeOther(HttpResponseRedirect):
+    """Redirect 303: POST -> GET explícito (padrão PRG)."""
+    status_code = 303
 
 
+# URLs resolvidas uma única vez (em vez de reverse() a cada POST do carrinho)
+@lru_cache(maxsize=None)
+def _product_detail_url_template() -> str:
+    return reverse("product_detail", kwargs={"slug": "__slug__"}).replace("__slug__", "{slug}")
+
+
+@lru_cache(maxsize=None)
+def _cart_detail_url() -> str:
+    return reverse("cart_detail")
+
+
+# campos de Address que os templates de listagem/checkout exibem
+ADDRESS_DISPLAY_FIELDS = (
+    "id", "cep", "street", "number", "complement", "district", "city", "state", "is_default",
+)
 
 
 class HomeView(ListView):
@@ -20,12 +69,31 @@ class HomeView(ListView):
     template_name = "core/home.html"
     context_object_name = "products"
     paginate_by = 12  # quantidade por página
+    cache_timeout = 60  # segundos
+
+    def get(self, request, *args, **kwargs):
+        # Só visitantes sem mensagens pendentes recebem a página do cache: o
+        # cabeçalho (usuário logado) e os alertas são específicos de cada sessão.
+        if request.user.is_authenticated or messages.get_messages(request):
+            return super().get(request, *args, **kwargs)
+
+        # a URL completa já inclui ?q= e ?page=
+        path_hash = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        cache_key = f"home:{path_hash}"
+        content = cache.get(cache_key)
+        if content is None:
+            response = super().get(request, *args, **kwargs)
+            response.render()
+            cache.set(cache_key, response.content, self.cache_timeout)
+            return response
+        return HttpResponse(content)
 
     def get_queryset(self):
-        qs = Product.objects.filter(is_active=True).select_related("category").order_by("name")
+        qs = Product.objects.for_card().order_by("name", "id")
 
         q = self.request.GET.get("q", "").strip()
         if q:
+            # no PostgreSQL é servido pelo índice trigram core_product_name_trgm_idx
             qs = qs.filter(name__icontains=q)
 
         return qs
@@ -80,38 +148,58 @@ class ProductDetailView(DetailView):
 
     def get_object(self, queryset=None):
         # Garante que só produtos ativos podem ser acessados
-        return get_object_or_404(Product, slug=self.kwargs["slug"], is_active=True)
+        return get_object_or_404(
+            Product.objects.active().select_related("category"),
+            slug=self.kwargs["slug"],
+        )
 
 
 @login_required
 @require_POST
 def add_to_cart_view(request, product_id: int):
-    product = get_object_or_404(Product, id=product_id, is_active=True)
-
-    # quantidade vem do form (string) -> int
-    qty_str = request.POST.get("quantity", "1").strip()
-    try:
-        quantity = int(qty_str)
-    except ValueError:
-        quantity = 1
+    # só o necessário para a mensagem e o redirect (o service trava a linha)
+    product = (
+        Product.objects
+        .active()
+        .filter(id=product_id)
+        .values("id", "name", "slug")
+        .first()
+    )
+    if product is None:
+        raise Http404("Produto não encontrado.")
 
-    # regra mínima: pelo menos 1
-    if quantity < 1:
-        quantity = 1
+    # quantidade vem do form (string) -> int; regra mínima: pelo menos 1
+    quantity = max(1, _parse_quantity(request.POST.get("quantity", "1")))
 
     try:
-        add_to_cart(user=request.user, product_id=product.id, quantity=quantity)
-        messages.success(request, f'"{product.name}" adicionado ao carrinho!')
-    except Exception as e:
-        # Ideal: tratar exceções específicas do service (ex: sem estoque)
+        add_to_cart(user=request.user, product_id=product["id"], quantity=quantity)
+        messages.success(request, f'"{product["name"]}" adicionado ao carrinho!')
+    except CartError as e:
         messages.error(request, f"Não foi possível adicionar ao carrinho: {e}")
 
     # volta para o detalhe do produto
-    return redirect("product_detail", slug=product.slug)
+    return HttpResponseSeeOther(_product_detail_url_template().format(slug=product["slug"]))
 
 
+def _cart_etag(request, *args, **kwargs):
+    """
+    ETag do carrinho: a chave de cache do resumo (lida do banco: itens e
+    updated_at dos produtos/categorias, igual em todos os processos) mais o
+    token CSRF dos formulários. Sem ETag se houver mensagens pendentes, que
+    só aparecem se a página for renderizada.
+    """
+    if messages.get_messages(request):
+        return None
+    csrf_cookie = request.COOKIES.get(settings.CSRF_COOKIE_NAME, "")
+    raw = f"{cart_summary_cache_key(cart=request.cart)}:{csrf_cookie}"
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_cart_etag)
 def cart_detail_view(request):
-    cart = get_or_create_active_cart(user=request.user)
+    cart = request.cart
     summary = cart_summary(cart=cart)
     return render(request, "core/cart_detail.html", {"cart": cart, "summary": summary})
 
@@ -122,7 +210,7 @@ def remove_cart_item_view(request, item_id: int):
     try:
         remove_cart_item(user=request.user, item_id=item_id)
         messages.success(request, "Item removido do carrinho.")
-    except Exception:
+    except (Cart.DoesNotExist, Http404):
         messages.error(request, "Não foi possível remover o item.")
 
     return redirect("cart_detail")
@@ -131,11 +219,8 @@ def remove_cart_item_view(request, item_id: int):
 @login_required
 @require_POST
 def update_cart_item_quantity_view(request, item_id: int):
-    qty_str = request.POST.get("quantity", "1").strip()
-    try:
-        quantity = int(qty_str)
-    except ValueError:
-        quantity = 1
+    # 0 remove o item
+    quantity = _parse_quantity(request.POST.get("quantity", "1"))
 
     try:
         updated = update_cart_item_quantity(user=request.user, item_id=item_id, quantity=quantity)
@@ -143,23 +228,33 @@ def update_cart_item_quantity_view(request, item_id: int):
             messages.success(request, "Item removido do carrinho.")
         else:
             messages.success(request, "Quantidade atualizada.")
-    except Exception as e:
+    except CartError as e:
         messages.error(request, f"Não foi possível atualizar a quantidade: {e}")
+    except Http404:
+        messages.error(request, "Item não encontrado no carrinho.")
 
-    return redirect("cart_detail")
+    return HttpResponseSeeOther(_cart_detail_url())
 
 
 @login_required
 def checkout_view(request):
-    cart = get_or_create_active_cart(user=request.user)
-    summary = cart_summary(cart=cart)
+    cart = request.cart
+    # sem cache: é aqui que o cliente confirma o valor que será cobrado
+    summary = compute_cart_summary(cart=cart)
 
     # se carrinho vazio, volta pro carrinho
     if not summary["items"]:
         messages.info(request, "Seu carrinho está vazio.")
         return redirect("cart_detail")
 
-    addresses = Address.objects.filter(user=request.user).order_by("-is_default", "-id")
+    # o padrão vem primeiro pela ordenação; busca 1 a mais só para saber se há outros
+    addresses = list(
+        Address.objects
+        .filter(user=request.user)
+        .only(*ADDRESS_DISPLAY_FIELDS)
+        .order_by("-is_default", "-id")[:CHECKOUT_ADDRESS_LIMIT + 1]
+    )
+    has_more_addresses = len(addresses) > CHECKOUT_ADDRESS_LIMIT
 
     return render(
         request,
@@ -167,7 +262,8 @@ def checkout_view(request):
         {
             "cart": cart,
             "summary": summary,
-            "addresses": addresses,
+            "addresses": addresses[:CHECKOUT_ADDRESS_LIMIT],
+            "has_more_addresses": has_more_addresses,
         },
     )
 
@@ -175,10 +271,10 @@ def checkout_view(request):
 @login_required
 @require_POST
 def checkout_confirm_view(request):
-    cart = get_or_create_active_cart(user=request.user)
-    summary = cart_summary(cart=cart)
+    cart = request.cart
 
-    if not summary["items"]:
+    # só precisa saber se há itens (o checkout_cart revalida tudo com lock)
+    if not cart.items.exists():
         messages.info(request, "Seu carrinho está vazio.")
         return redirect("cart_detail")
 
@@ -189,42 +285,64 @@ def checkout_confirm_view(request):
 
     address_id = int(address_id_str)
 
-    # garante que o endereço pertence ao usuário
-    address = get_object_or_404(Address, id=address_id, user=request.user)
-
+    # o checkout_cart já valida que o endereço pertence ao usuário
     try:
-        order = checkout_cart(user=request.user, cart_id=cart.id, address_id=address.id)
+        order = checkout_cart(user=request.user, cart_id=cart.id, address_id=address_id)
         messages.success(request, "Pedido criado com sucesso!")
         return redirect("order_detail", order_id=order.id)
-    except Exception as e:
+    except CheckoutError as e:
         messages.error(request, f"Não foi possível finalizar a compra: {e}")
         return redirect("checkout")
 
 
 def order_detail_view(request, order_id: int):
-    order = get_object_or_404(Order, id=order_id, user=request.user)
-    items = order.items.select_related("product").all()  # se related_name="items"
+    order = get_object_or_404(
+        Order.objects.with_items().select_related("payment"),
+        id=order_id,
+        user=request.user,
+    )
+    # itens (produto + categoria) já pré-carregados por with_items(); o endereço
+    # é o snapshot gravado no próprio pedido, sem JOIN extra
+    items = order.items.all()
     return render(request, "core/order_detail.html", {"order": order, "items": items})
 
 
 @login_required
 def address_list_view(request):
-    addresses = Address.objects.filter(user=request.user).order_by("-is_default", "-id")
+    addresses = (
+        Address.objects
+        .filter(user=request.user)
+        .only(*ADDRESS_DISPLAY_FIELDS)
+        .order_by("-is_default", "-id")
+    )
     return render(request, "core/address_list.html", {"addresses": addresses})
 
 
+def _set_default_address(user, address_id: int) -> None:
+    # um único UPDATE: marca o escolhido e desmarca os demais
+    Address.objects.filter(user=user).update(
+        is_default=Case(
+            When(id=address_id, then=Value(True)),
+            default=Value(False),
+        )
+    )
+
+
 @login_required
 def address_create_view(request):
     if request.method == "POST":
         form = AddressForm(request.POST)
         if form.is_valid():
-            addr = form.save(commit=False)
-            addr.user = request.user
-            addr.save()
+            with transaction.atomic():
+                addr = form.save(commit=False)
+                addr.user = request.user
+                make_default = addr.is_default
+                addr.is_default = False
+                addr.save()
 
-            # Se marcou como padrão, desmarca os demais
-            if addr.is_default:
-                Address.objects.filter(user=request.user).exclude(id=addr.id).update(is_default=False)
+                # Se marcou como padrão, marca este e desmarca os demais
+                if make_default:
+                    _set_default_address(request.user, addr.id)
 
             messages.success(request, "Endereço cadastrado com sucesso!")
             return redirect("address_list")
@@ -237,11 +355,11 @@ def address_create_view(request):
 @login_required
 @require_POST
 def address_set_default_view(request, address_id: int):
-    addr = get_object_or_404(Address, id=address_id, user=request.user)
+    with transaction.atomic():
+        if not Address.objects.filter(id=address_id, user=request.user).exists():
+            raise Http404("Endereço não encontrado.")
 
-    Address.objects.filter(user=request.user).update(is_default=False)
-    addr.is_default = True
-    addr.save(update_fields=["is_default"])
+        _set_default_address(request.user, address_id)
 
     messages.success(request, "Endereço padrão atualizado!")
     return redirect("address_list")
@@ -266,6 +384,8 @@ class OrderListView(LoginRequiredMixin, ListView):
         return (
             Order.objects
             .filter(user=self.request.user)
+            # a listagem só mostra a quantidade de itens: COUNT no banco, sem carregar linhas
+            .annotate(item_count=Count("items"))
             .order_by("-created_at")
         )
 
@@ -277,15 +397,14 @@ def order_pay_view(request, order_id: int):
     method = (request.POST.get("method") or "").strip().lower()
 
     # Valida o método (pix/card/boleto)
-    allowed_methods = {choice[0] for choice in Payment.Method.choices}
-    if method not in allowed_methods:
+    if method not in ALLOWED_PAYMENT_METHODS:
         messages.error(request, "Selecione um método de pagamento válido.")
         return redirect("order_detail", order_id=order_id)
 
     try:
         simulate_payment(user=request.user, order_id=order_id, method=method)
         messages.success(request, "Pagamento aprovado (simulação)!")
-    except Exception as e:
+    except PaymentError as e:
         messages.error(request, f"Não foi possível concluir o pagamento: {e}")
 
     return redirect("order_detail", order_id=order_id)